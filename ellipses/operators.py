@@ -1,15 +1,17 @@
+import functools
 import math
 
 from abc import ABC, abstractmethod
 
 import numpy as np
 import pytorch_radon
-import skimage.transform
 import torch
-import torch_cg
 
-from fastmri_utils.data import transforms
-from fastmri_utils.data.transforms import fftshift, ifftshift
+
+try:
+    import torch_radon
+except ImportError:  # optional CUDA backend for the Radon transform
+    torch_radon = None
 
 
 # ----- Utilities -----
@@ -49,29 +51,65 @@ class RadialMaskFunc(object):
         )
 
     def _generate_radial_mask(self, shape, num_lines, offset=0):
-        # generate line template and empty mask
-        x, y = shape
-        d = math.ceil(np.sqrt(2) * max(x, y))
-        line = np.zeros((d, d))
-        line[d // 2, :] = 1.0
-        out = np.zeros((d, d))
-        # compute golden angle sequence
-        golden = (np.sqrt(5) - 1) / 2
-        angles = (
-            180.0
-            * golden
-            * np.arange(offset * num_lines, (offset + 1) * num_lines)
-        )
-        # draw lines
-        for angle in angles:
-            out += skimage.transform.rotate(line, angle, order=0)
-        # crop mask to correct size
-        out = out[
-            d // 2 - math.floor(x / 2) : d // 2 + math.ceil(x / 2),
-            d // 2 - math.floor(y / 2) : d // 2 + math.ceil(y / 2),
-        ]
-        # return binary mask
-        return torch.tensor(out > 0)
+        # masks are purely geometric, reuse them across instances
+        return _radial_mask(tuple(shape), num_lines, offset).clone()
+
+
+@functools.lru_cache(maxsize=None)
+def _radial_mask(shape, num_lines, offset):
+    """ Cached golden angle radial mask, see `RadialMaskFunc`. """
+    # generate empty mask
+    x, y = shape
+    d = math.ceil(np.sqrt(2) * max(x, y))
+    out = np.zeros((d, d), dtype=bool)
+    # compute golden angle sequence
+    golden = (np.sqrt(5) - 1) / 2
+    angles = (
+        180.0
+        * golden
+        * np.arange(offset * num_lines, (offset + 1) * num_lines)
+    )
+    # draw all lines at once, reproducing a nearest neighbour rotation of
+    # the horizontal centre line (as in skimage.transform.rotate) but only
+    # evaluating the few candidate pixels per line instead of all d x d
+    rad = np.deg2rad(angles)[:, None, None]
+    cos, sin = np.cos(rad), np.sin(rad)
+    c = d / 2 - 0.5  # centre of rotation
+    t = np.arange(d)[None, :, None]  # running index along each line
+    k = np.arange(-1, 2)[None, None, :]  # candidate offsets across lines
+    flat = np.abs(cos) >= np.abs(sin)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t_row = c + (d // 2 - c - sin * (t - c)) / cos
+        t_col = c + (d // 2 - c - cos * (t - c)) / sin
+    rows = np.where(flat, np.rint(t_row) + k, t)
+    cols = np.where(flat, t, np.rint(t_col) + k)
+    # keep candidates that are mapped onto the line by inverse rotation
+    src_row = np.floor(sin * (cols - c) + cos * (rows - c) + c + 0.5)
+    src_col = np.floor(cos * (cols - c) - sin * (rows - c) + c + 0.5)
+    hit = (
+        (src_row == d // 2)
+        & (src_col >= 0)
+        & (src_col < d)
+        & (rows >= 0)
+        & (rows < d)
+        & (cols >= 0)
+        & (cols < d)
+    )
+    out[rows[hit].astype(np.intp), cols[hit].astype(np.intp)] = True
+    # crop mask to correct size
+    out = out[
+        d // 2 - math.floor(x / 2) : d // 2 + math.ceil(x / 2),
+        d // 2 - math.floor(y / 2) : d // 2 + math.ceil(y / 2),
+    ]
+    # return binary mask
+    return torch.from_numpy(np.ascontiguousarray(out))
+
+
+def _l2_norm(x, dim, squared=False):
+    """ (Squared) l2-norm over the given dimensions. """
+    if squared:
+        return x.square().sum(dim)
+    return torch.linalg.vector_norm(x, dim=dim)
 
 
 def l2_error(X, X_ref, relative=False, squared=False, use_magnitude=True):
@@ -102,22 +140,17 @@ def l2_error(X, X_ref, relative=False, squared=False, use_magnitude=True):
     assert X_ref.ndim >= 3  # do not forget the channel dimension
 
     if X_ref.shape[-3] == 2 and use_magnitude:  # compare complex magnitudes
-        X_flat = torch.flatten(torch.sqrt(X.pow(2).sum(-3)), -2, -1)
-        X_ref_flat = torch.flatten(torch.sqrt(X_ref.pow(2).sum(-3)), -2, -1)
+        X_cmp = X.square().sum(-3).sqrt()
+        X_ref_cmp = X_ref.square().sum(-3).sqrt()
+        dim = (-2, -1)
     else:
-        X_flat = torch.flatten(X, -3, -1)
-        X_ref_flat = torch.flatten(X_ref, -3, -1)
+        X_cmp, X_ref_cmp = X, X_ref
+        dim = (-3, -2, -1)
 
-    if squared:
-        err = (X_flat - X_ref_flat).norm(p=2, dim=-1) ** 2
-    else:
-        err = (X_flat - X_ref_flat).norm(p=2, dim=-1)
+    err = _l2_norm(X_cmp - X_ref_cmp, dim, squared)
 
     if relative:
-        if squared:
-            err = err / (X_ref_flat.norm(p=2, dim=-1) ** 2)
-        else:
-            err = err / X_ref_flat.norm(p=2, dim=-1)
+        err = err / _l2_norm(X_ref_cmp, dim, squared)
 
     if X_ref.ndim > 3:
         err_av = err.sum() / np.prod(X_ref.shape[:-3])
@@ -153,19 +186,10 @@ def l2_error_meas(X, X_ref, relative=False, squared=False):
     """
     assert X_ref.ndim >= 2  # do not forget the channel dimension
 
-    X_flat = torch.flatten(X, -2, -1)
-    X_ref_flat = torch.flatten(X_ref, -2, -1)
-
-    if squared:
-        err = (X_flat - X_ref_flat).norm(p=2, dim=-1) ** 2
-    else:
-        err = (X_flat - X_ref_flat).norm(p=2, dim=-1)
+    err = _l2_norm(X - X_ref, (-2, -1), squared)
 
     if relative:
-        if squared:
-            err = err / (X_ref_flat.norm(p=2, dim=-1) ** 2)
-        else:
-            err = err / X_ref_flat.norm(p=2, dim=-1)
+        err = err / _l2_norm(X_ref, (-2, -1), squared)
 
     if X_ref.ndim > 2:
         err_av = err.sum() / np.prod(X_ref.shape[:-2])
@@ -181,8 +205,10 @@ def noise_gaussian(y, eta, n_seed=None, t_seed=None):
     if t_seed is not None:
         torch.manual_seed(t_seed)
 
-    noise = torch.randn_like(y)
-    return y + eta / np.sqrt(np.prod(y.shape[1:])) * noise
+    sigma = torch.as_tensor(
+        eta / np.sqrt(np.prod(y.shape[1:])), dtype=y.dtype, device=y.device
+    )
+    return torch.addcmul(y, torch.randn_like(y), sigma)
 
 
 def noise_poisson(y, eta, n_seed=None, t_seed=None):
@@ -192,8 +218,7 @@ def noise_poisson(y, eta, n_seed=None, t_seed=None):
     if t_seed is not None:
         torch.manual_seed(t_seed)
     scale_fac = y.sum(dim=-1, keepdim=True) / (eta ** 2)
-    noisy_y = torch.poisson(scale_fac * y) / scale_fac
-    return noisy_y
+    return torch.poisson(scale_fac * y).div_(scale_fac)
 
 
 def to_complex(x):
@@ -201,8 +226,8 @@ def to_complex(x):
     assert x.ndim >= 3 and (x.shape[-3] == 1 or x.shape[-3] == 2)
     # real tensor of shape (1, n1, n2) or batch of shape (*, 1, n1, n2)
     if x.shape[-3] == 1:
-        imag = torch.zeros_like(x)
-        out = torch.cat([x, imag], dim=-3)
+        out = x.new_zeros(*x.shape[:-3], 2, *x.shape[-2:])
+        out[..., :1, :, :] = x
     else:
         out = x
     return out
@@ -216,26 +241,49 @@ def rotate_real(x):
     return x_rv
 
 
+def as_complex(x):
+    """ Converts complex channel dimension to a native complex tensor. """
+    assert x.ndim >= 3 and x.shape[-3] == 2
+    return torch.view_as_complex(x.movedim(-3, -1).contiguous())
+
+
+def as_real(x):
+    """ Views a native complex tensor as real with complex channel dim. """
+    return torch.view_as_real(x).movedim(-1, -3)
+
+
+def vec_as_complex(y):
+    """ Converts complex channel of (*, 2, m) vectors to a native tensor. """
+    assert y.ndim >= 2 and y.shape[-2] == 2
+    return torch.view_as_complex(y.transpose(-2, -1).contiguous())
+
+
+def vec_as_real(y):
+    """ Converts native complex (*, m) vectors to (*, 2, m) real tensors. """
+    return torch.view_as_real(y).transpose(-2, -1).contiguous()
+
+
 def mult_complex(x, y):
     """ Multiply two complex tensors with real and imag in last dimension. """
-    out_real = x[..., 0] * y[..., 0] - x[..., 1] * y[..., 1]
-    out_imag = x[..., 0] * y[..., 1] + x[..., 1] * y[..., 0]
-    return torch.stack([out_real, out_imag], dim=-1)
+    return torch.view_as_real(
+        torch.view_as_complex(x.contiguous())
+        * torch.view_as_complex(y.contiguous())
+    )
 
 
 def div_complex(x, y):
     """ Divide two complex tensors with real and imag in last dimension. """
-    out_real = x[..., 0] * y[..., 0] + x[..., 1] * y[..., 1]
-    out_imag = x[..., 1] * y[..., 0] - x[..., 0] * y[..., 1]
-    denom = y[..., 0].pow(2) + y[..., 1].pow(2)
-    return torch.stack([out_real / denom, out_imag / denom], dim=-1)
+    return torch.view_as_real(
+        torch.view_as_complex(x.contiguous())
+        / torch.view_as_complex(y.contiguous())
+    )
 
 
 def conj_complex(x):
     """ Complex conjugate of tensor with real and imag in last dimension. """
-    out_real = x[..., 0]
-    out_imag = -x[..., 1]
-    return torch.stack([out_real, out_imag], dim=-1)
+    return torch.view_as_real(
+        torch.view_as_complex(x.contiguous()).conj().resolve_conj()
+    )
 
 
 def im2vec(x, dims=(-2, -1)):
@@ -245,7 +293,7 @@ def im2vec(x, dims=(-2, -1)):
 
 def vec2im(x, n):
     """ Unflattens the last dimension of a vector to two image dimensions. """
-    return x.view(*x.shape[:-1], *n)
+    return x.reshape(*x.shape[:-1], *n)
 
 
 def prep_fft_channel(x):
@@ -262,13 +310,35 @@ def unprep_fft_channel(x):
     )
 
 
+def fft2c(x):
+    """ Centered orthonormal 2D FFT of a native complex tensor. """
+    x = torch.fft.ifftshift(x, dim=(-2, -1))
+    x = torch.fft.fft2(x, norm="ortho")
+    return torch.fft.fftshift(x, dim=(-2, -1))
+
+
+def ifft2c(x):
+    """ Centered orthonormal 2D IFFT of a native complex tensor. """
+    x = torch.fft.ifftshift(x, dim=(-2, -1))
+    x = torch.fft.ifft2(x, norm="ortho")
+    return torch.fft.fftshift(x, dim=(-2, -1))
+
+
+def _mask2d(mask):
+    """ Boolean 2D sampling pattern of a (*, n1, n2) subsampling mask. """
+    return mask[(0,) * (mask.ndim - 2)].bool()
+
+
+def _maybe_compile(fn, compiled):
+    """ Wraps fn with torch.compile if requested and available. """
+    if compiled and hasattr(torch, "compile"):
+        return torch.compile(fn)
+    return fn
+
+
 def circshift(x, dim=-1, num=1):
     """ Circular shift by n along a dimension. """
-    perm = list(range(num, x.shape[dim])) + list(range(0, num))
-    if not dim == -1:
-        return x.transpose(dim, -1)[..., perm].transpose(dim, -1)
-    else:
-        return x[..., perm]
+    return torch.roll(x, -num, dim)
 
 
 # ----- Thresholding, Projections, and Proximal Operators -----
@@ -276,6 +346,8 @@ def circshift(x, dim=-1, num=1):
 
 def _shrink_single(x, thresh):
     """ Soft/Shrinkage thresholding for tensors. """
+    if torch.is_tensor(thresh):  # broadcastable, e.g. per-sample thresholds
+        return x - x.clamp(-thresh, thresh)
     return torch.nn.Softshrink(thresh)(x)
 
 
@@ -307,11 +379,11 @@ def proj_l2_ball(x, centre, radius):
     torch.Tensor
         The projection of x onto the closed ball.
     """
-    norm = torch.sqrt((x - centre).pow(2).sum(dim=(-2, -1), keepdim=True))
-    radius, norm = torch.broadcast_tensors(radius, norm)
-    fac = torch.ones_like(norm)
-    fac[norm > radius] = radius[norm > radius] / norm[norm > radius]
-    return fac * x + (1 - fac) * centre
+    diff = x - centre
+    norm = diff.pow(2).sum(dim=(-2, -1), keepdim=True).sqrt_()
+    # fac = min(1, radius / norm), kept finite for radius = norm = 0
+    denom = norm.clamp_min(radius).clamp_min_(torch.finfo(norm.dtype).tiny)
+    return torch.addcmul(centre, radius / denom, diff)
 
 
 # ----- Linear Operator Utilities -----
@@ -417,30 +489,36 @@ class Fourier(LinearOperator):
     Parameters
     ----------
     mask : torch.Tensor
-        The subsampling mask for the Fourier transform.
+        The subsampling mask for the Fourier transform, of shape (n1, n2) or
+        (1, 1, n1, n2).
 
     """
 
     def __init__(self, mask):
-        m = mask.nonzero().shape[0]
-        n = mask.shape[-2:]
-        super().__init__(m, n)
-        self.mask = mask[0, 0, :, :].bool()
+        mask2d = _mask2d(mask)
+        super().__init__(int(mask2d.sum()), mask2d.shape)
+        self.mask = mask2d
+        self.idx = im2vec(self.mask).nonzero(as_tuple=True)[0]
+
+    def _to_device(self, device):
+        """ Keeps mask and sampled indices on the device of the last input. """
+        if self.idx.device != device:
+            self.mask = self.mask.to(device)
+            self.idx = self.idx.to(device)
 
     def dot(self, x):
         """ Subsampled Fourier transform. """
-        full_fft = unprep_fft_channel(transforms.fft2(prep_fft_channel(x)))
-        return im2vec(full_fft)[..., im2vec(self.mask)]
+        self._to_device(x.device)
+        full_fft = im2vec(fft2c(as_complex(x)))
+        return vec_as_real(full_fft.index_select(-1, self.idx))
 
     def adj(self, y):
         """ Adjoint is the zeor-filled inverse Fourier transform. """
-        masked_fft = torch.zeros(
-            *y.shape[:-1], self.n[0] * self.n[1], device=y.device
-        )
-        masked_fft[..., im2vec(self.mask)] = y
-        return unprep_fft_channel(
-            transforms.ifft2(prep_fft_channel(vec2im(masked_fft, self.n)))
-        )
+        self._to_device(y.device)
+        y_c = vec_as_complex(y)
+        masked_fft = y_c.new_zeros(*y_c.shape[:-1], self.n[0] * self.n[1])
+        masked_fft.index_copy_(-1, self.idx, y_c)
+        return as_real(ifft2c(vec2im(masked_fft, self.n)))
 
     def inv(self, y):
         """ Pseudo-inverse a.k.a. zero-filled IFFT. """
@@ -475,12 +553,12 @@ class Fourier(LinearOperator):
 
         """
         assert rhs.ndim >= 3 and rhs.shape[-3] == 2  # assert complex images
-        fft_rhs = transforms.fft2(prep_fft_channel(rhs))
-        combined_kernel = prep_fft_channel(
-            to_complex(self.mask.unsqueeze(0).to(rhs.device))
-        ) + rho * kernel.to(rhs.device)
-        fft_div = div_complex(fft_rhs, combined_kernel)
-        return unprep_fft_channel(transforms.ifft2(fft_div))
+        self._to_device(rhs.device)
+        fft_rhs = fft2c(as_complex(rhs))
+        combined_kernel = self.mask + rho * (
+            torch.view_as_complex(kernel.to(rhs.device))[..., 0, :, :]
+        )
+        return as_real(ifft2c(fft_rhs / combined_kernel))
 
 
 class Fourier_matrix(LinearOperator, torch.nn.Module):
@@ -497,30 +575,42 @@ class Fourier_matrix(LinearOperator, torch.nn.Module):
     Parameters
     ----------
     mask : torch.Tensor
-        The subsampling mask for the Fourier transform.
+        The subsampling mask for the Fourier transform, of shape (n1, n2) or
+        (1, 1, n1, n2).
+    compiled : bool, optional
+        Wrap `dot`, `adj` and `tikh` with `torch.compile` (if available).
+        (Default False)
 
     """
 
-    def __init__(self, mask):
-        m = mask.nonzero().shape[0]
-        n = mask.shape[-2:]
-        LinearOperator.__init__(self, m, n)
+    def __init__(self, mask, compiled=False):
+        mask2d = _mask2d(mask)
+        n = mask2d.shape
+        LinearOperator.__init__(self, int(mask2d.sum()), n)
         torch.nn.Module.__init__(self)
-        self.mask = mask[0, 0, :, :].bool()
+        self.register_buffer("mask", mask2d, persistent=False)
+        self.register_buffer(
+            "idx",
+            im2vec(self.mask).nonzero(as_tuple=True)[0],
+            persistent=False,
+        )
         self.fft2 = LearnableFourier2D(n, inverse=False, learnable=False)
         self.ifft2 = LearnableFourier2D(n, inverse=True, learnable=False)
+        self.dot = _maybe_compile(self.dot, compiled)
+        self.adj = _maybe_compile(self.adj, compiled)
+        self.tikh = _maybe_compile(self.tikh, compiled)
 
     def dot(self, x):
         """ Subsampled Fourier transform. """
         full_fft = self.fft2(x)
-        return im2vec(full_fft)[..., im2vec(self.mask)]
+        return im2vec(full_fft).index_select(-1, self.idx)
 
     def adj(self, y):
         """ Adjoint is the zeor-filled inverse Fourier transform. """
         masked_fft = torch.zeros(
             *y.shape[:-1], self.n[0] * self.n[1], device=y.device
         )
-        masked_fft[..., im2vec(self.mask)] = y
+        masked_fft.index_copy_(-1, self.idx, y)
         return self.ifft2(vec2im(masked_fft, self.n))
 
     def inv(self, y):
@@ -556,12 +646,11 @@ class Fourier_matrix(LinearOperator, torch.nn.Module):
 
         """
         assert rhs.ndim >= 3 and rhs.shape[-3] == 2  # assert complex images
-        fft_rhs = prep_fft_channel(self.fft2(rhs))
-        combined_kernel = prep_fft_channel(
-            to_complex(self.mask.unsqueeze(0).to(rhs.device))
-        ) + rho * kernel.to(rhs.device)
-        fft_div = unprep_fft_channel(div_complex(fft_rhs, combined_kernel))
-        return self.ifft2(fft_div)
+        fft_rhs = as_complex(self.fft2(rhs))
+        combined_kernel = self.mask + rho * (
+            torch.view_as_complex(kernel.to(rhs.device))[..., 0, :, :]
+        )
+        return self.ifft2(as_real(fft_rhs / combined_kernel))
 
 
 class Radon(LinearOperator):
@@ -581,9 +670,14 @@ class Radon(LinearOperator):
     theta : torch.Tensor
         The angles that are sampled for the Radon transform. The
         number of total measurements m will be calculated automatically.
+    use_torch_radon : bool, optional
+        Use the fused CUDA projectors of `torch_radon` for inputs on the GPU.
+        Inputs on the CPU always use `pytorch_radon`. Experimental: on first
+        use they are checked against `pytorch_radon` and for adjointness,
+        a failed check disables them and raises. (Default False)
     """
 
-    def __init__(self, n, theta):
+    def __init__(self, n, theta, use_torch_radon=False):
         assert n[0] == n[1]
         self.radon = pytorch_radon.Radon(
             in_size=n[0], theta=theta, circle=False
@@ -602,15 +696,85 @@ class Radon(LinearOperator):
         self.iradon_adj = pytorch_radon.IRadon(
             in_size=n[0], theta=theta, circle=False, use_filter=None
         )
+        self.radon_gpu = None
+        self._radon_gpu_checked = False
+        if use_torch_radon:
+            if torch_radon is None:
+                raise ImportError("use_torch_radon requires torch_radon.")
+            volume = torch_radon.Volume2D()
+            volume.set_size(*n)
+            self.radon_gpu = torch_radon.ParallelBeam(
+                det_count=self.m_shape[0],
+                angles=np.deg2rad(torch.as_tensor(theta).cpu().numpy()),
+                volume=volume,
+            )
         super().__init__(np.prod(self.m_shape), n)
 
+    def _use_gpu(self, x):
+        """ Whether to apply the torch_radon projectors to x. """
+        use_gpu = self.radon_gpu is not None and x.is_cuda
+        if use_gpu and not self._radon_gpu_checked:
+            self._radon_gpu_checked = True  # the check itself uses the GPU
+            try:
+                self._check_radon_gpu(x.device)
+            except RuntimeError:
+                self.radon_gpu = None  # fall back to pytorch_radon
+                raise
+        return use_gpu
+
+    def _check_radon_gpu(self, device, rtol=5e-2, adj_rtol=1e-3):
+        """ Compares the torch_radon projectors to pytorch_radon.
+
+        Mismatching angle directions, detector flips or scalings of `dot`,
+        `adj` and `inv` as well as a broken adjointness raise an error.
+        """
+        g1 = torch.linspace(-1, 1, self.n[0]).view(-1, 1)
+        g2 = torch.linspace(-1, 1, self.n[1]).view(1, -1)
+        # off-center blob, so mirrored or rotated sinograms do not match
+        x = torch.exp(-((g1 - 0.3) ** 2 + (g2 + 0.2) ** 2) / 0.05)
+        x = x[None, None]
+        with torch.no_grad():
+            y = self.dot(x)
+            checks = {
+                "dot": (self.dot(x.to(device)), y),
+                "adj": (self.adj(y.to(device)), self.adj(y)),
+                "inv": (self.inv(y.to(device)), self.inv(y)),
+            }
+            for name, (out, ref) in checks.items():
+                err = ((out.cpu() - ref).norm() / ref.norm()).item()
+                if not err <= rtol:
+                    raise RuntimeError(
+                        "torch_radon and pytorch_radon disagree for "
+                        "Radon.{} (rel. error {:1.2e}), use "
+                        "use_torch_radon=False.".format(name, err)
+                    )
+
+            x_rand = torch.randn(1, 1, *self.n, device=device)
+            y_rand = torch.randn(1, 1, int(self.m), device=device)
+            lhs = (self.dot(x_rand) * y_rand).sum().item()
+            rhs = (x_rand * self.adj(y_rand)).sum().item()
+            if not abs(lhs - rhs) <= adj_rtol * max(abs(lhs), abs(rhs)):
+                raise RuntimeError(
+                    "The torch_radon Radon.adj is not the adjoint of "
+                    "Radon.dot ({:1.4e} vs. {:1.4e}), use "
+                    "use_torch_radon=False.".format(lhs, rhs)
+                )
+
+    def _to_sino(self, y):
+        """ Measurement vectors to torch_radon sinograms (angles first). """
+        return vec2im(y, self.m_shape).transpose(-2, -1).contiguous()
+
     def dot(self, x):
+        if self._use_gpu(x):
+            return im2vec(self.radon_gpu.forward(x).transpose(-2, -1))
         if x.ndim == 3:  # no batch dimension
             return im2vec(self.radon(x.unsqueeze(0)).squeeze(0))
         else:
             return im2vec(self.radon(x))
 
     def adj(self, y):
+        if self._use_gpu(y):
+            return self.radon_gpu.backward(self._to_sino(y))
         if y.ndim == 2:  # no batch dimension
             return (
                 self.iradon_adj(vec2im(y, self.m_shape).unsqueeze(0)).squeeze(
@@ -622,6 +786,9 @@ class Radon(LinearOperator):
             return self.iradon_adj(vec2im(y, self.m_shape)) / self.adj_factor
 
     def inv(self, y):
+        if self._use_gpu(y):
+            sino = self.radon_gpu.filter_sinogram(self._to_sino(y), "hann")
+            return self.radon_gpu.backward(sino)
         if y.ndim == 2:  # no batch dimension
             return self.iradon_inv(
                 vec2im(y, self.m_shape).unsqueeze(0)
@@ -651,15 +818,20 @@ class TVAnalysisPeriodic(LinearOperator):
     device : torch.Device or int, optional
         The torch device or its ID to place the operator on. Set to `None` to
         use the global torch default device. (Default `None`)
+    compiled : bool, optional
+        Wrap `dot` and `adj` with `torch.compile` (if available).
+        (Default False)
     """
 
-    def __init__(self, n, device=None):
+    def __init__(self, n, device=None, compiled=False):
         super().__init__(n[0] * n[1] * 2, n)
         self.device = device
+        self.dot = _maybe_compile(self.dot, compiled)
+        self.adj = _maybe_compile(self.adj, compiled)
 
     def dot(self, x):
-        row_diff = circshift(x, dim=-2) - x
-        col_diff = circshift(x, dim=-1) - x
+        row_diff = torch.roll(x, -1, -2).sub_(x)
+        col_diff = torch.roll(x, -1, -1).sub_(x)
         return torch.cat([im2vec(row_diff), im2vec(col_diff)], dim=-1,)
 
     def adj(self, y):
@@ -669,26 +841,21 @@ class TVAnalysisPeriodic(LinearOperator):
         col_diff = vec2im(
             y[..., self.n[0] * self.n[1] :], (self.n[0], self.n[1])
         )
-        return (
-            circshift(row_diff, dim=-2, num=self.n[0] - 1)
-            - row_diff
-            + circshift(col_diff, dim=-1, num=self.n[0] - 1)
-            - col_diff
-        )
+        out = torch.roll(row_diff, 1, -2).sub_(row_diff)
+        return out.add_(torch.roll(col_diff, 1, -1)).sub_(col_diff)
 
     def get_fourier_kernel(self):
         """ The factors of the operator after diagonalization by 2D FFTs. """
-        kernel = torch.zeros(self.n[0], self.n[1]).unsqueeze(-3)
-        kernel[0, 0, 0] = 4
-        kernel[0, 0, 1] = -1
-        kernel[0, 1, 0] = -1
-        kernel[0, 0, -1] = -1
-        kernel[0, -1, 0] = -1
-
-        return transforms.fftshift(
-            torch.fft(prep_fft_channel(to_complex(kernel)), signal_ndim=2),
-            dim=(-3, -2),
+        # closed form 2D DFT of the periodic 5-point Laplacian stencil
+        k1 = torch.arange(self.n[0], device=self.device).view(-1, 1)
+        k2 = torch.arange(self.n[1], device=self.device).view(1, -1)
+        kernel = (
+            4
+            - 2 * torch.cos(2 * math.pi * k1 / self.n[0])
+            - 2 * torch.cos(2 * math.pi * k2 / self.n[1])
         )
+        kernel = torch.fft.fftshift(kernel, dim=(-2, -1))
+        return torch.stack([kernel, torch.zeros_like(kernel)], dim=-1)[None]
 
     def inv(self, y):
         raise NotImplementedError(
@@ -723,41 +890,41 @@ class LearnableFourier1D(torch.nn.Module):
         super(LearnableFourier1D, self).__init__()
         self.n = n
         self.dim = dim
-        eye_n = torch.stack([torch.eye(n), torch.zeros(n, n)], dim=-1)
-        if inverse:
-            fft_n = ifftshift(
-                torch.ifft(
-                    fftshift(eye_n, dim=1), signal_ndim=1, normalized=True
-                ),
-                dim=1,
+        self.learnable = learnable
+        self.fft_fn = torch.fft.ifft if inverse else torch.fft.fft
+        if learnable:
+            fft_n = self._transform(torch.eye(n, dtype=torch.cfloat), 0)
+            fft_real_n = fft_n.real
+            fft_imag_n = fft_n.imag
+            fft_matrix = torch.cat(
+                [
+                    torch.cat([fft_real_n, -fft_imag_n], dim=1),
+                    torch.cat([fft_imag_n, fft_real_n], dim=1),
+                ],
+                dim=0,
             )
-        else:
-            fft_n = ifftshift(
-                torch.fft(
-                    fftshift(eye_n, dim=1), signal_ndim=1, normalized=True
-                ),
-                dim=1,
-            )
-        fft_real_n = fft_n[..., 0]
-        fft_imag_n = fft_n[..., 1]
-        fft_matrix = torch.cat(
-            [
-                torch.cat([fft_real_n, -fft_imag_n], dim=1),
-                torch.cat([fft_imag_n, fft_real_n], dim=1),
-            ],
-            dim=0,
-        )
-        self.linear = torch.nn.Linear(2 * n, 2 * n, bias=False)
-        self.linear.weight.data = (
-            fft_matrix
-            + 1 / (np.sqrt(self.n) * 16) * torch.randn_like(fft_matrix)
-            if learnable
-            else fft_matrix
-        )
-        self.linear.weight.requires_grad = learnable
+            self.linear = torch.nn.Linear(2 * n, 2 * n, bias=False)
+            self.linear.weight.data = fft_matrix + 1 / (
+                np.sqrt(self.n) * 16
+            ) * torch.randn_like(fft_matrix)
+        self._register_load_state_dict_pre_hook(self._drop_fixed_weight)
+
+    def _transform(self, x, dim):
+        """ Centered orthonormal 1D (I)FFT of a native complex tensor. """
+        x = torch.fft.fftshift(x, dim=dim)
+        x = self.fft_fn(x, dim=dim, norm="ortho")
+        return torch.fft.ifftshift(x, dim=dim)
+
+    def _drop_fixed_weight(self, state_dict, prefix, *args):
+        """ Ignore stored matrices of fixed transforms in old checkpoints. """
+        if not self.learnable:
+            state_dict.pop(prefix + "linear.weight", None)
 
     def forward(self, x):
         xt = torch.transpose(x, self.dim, -1)
+        if not self.learnable:
+            fft_xt = as_real(self._transform(as_complex(xt), -1))
+            return torch.transpose(fft_xt, -1, self.dim)
         x_real = xt[..., 0, :, :]
         x_imag = xt[..., 1, :, :]
         x_vec = torch.cat([x_real, x_imag], dim=-1)
@@ -798,9 +965,21 @@ class LearnableFourier2D(torch.nn.Module):
         self.linear2 = LearnableFourier1D(
             n[1], dim=-1, inverse=inverse, learnable=learnable
         )
+        self.n = n
+        self.learnable = learnable
+        self.fft_fn = torch.fft.ifft2 if inverse else torch.fft.fft2
 
     def forward(self, x):
-        return self.linear1(self.linear2(x))
+        if not self.learnable:
+            x = torch.fft.fftshift(as_complex(x), dim=(-2, -1))
+            x = self.fft_fn(x, dim=(-2, -1), norm="ortho")
+            return as_real(torch.fft.ifftshift(x, dim=(-2, -1)))
+        # contract the real (2n, 2n) matrices of the 1D modules directly over
+        # (channel, position), indexed as [c_out, k_out, c_in, k_in]
+        w1 = self.linear1.linear.weight.view(2, self.n[0], 2, self.n[0])
+        w2 = self.linear2.linear.weight.view(2, self.n[1], 2, self.n[1])
+        x = torch.einsum("aucw,...chw->...ahu", w2, x)
+        return torch.einsum("bvah,...ahu->...bvu", w1, x)
 
 
 class LearnableInverter(torch.nn.Module):
@@ -818,23 +997,35 @@ class LearnableInverter(torch.nn.Module):
     n : tuple of int
         Dimensions of the range of the operator.
     mask : torch.Tensor
-        The subsampling mask. Determines m.
+        The subsampling mask of shape (n1, n2) or (1, 1, n1, n2).
+        Determines m.
+    learnable : bool, optional
+        Make the inversion learnable. Otherwise it will be kept fixed as the
+        inverse Fourier transform. (Default True)
+    compiled : bool, optional
+        Wrap `forward` with `torch.compile` (if available). (Default False)
 
     """
 
-    def __init__(self, n, mask, learnable=True):
+    def __init__(self, n, mask, learnable=True, compiled=False):
         super(LearnableInverter, self).__init__()
         self.n = n
-        self.mask = mask[0, 0, :, :].bool()
+        self.mask = _mask2d(mask)
+        self.register_buffer(
+            "idx",
+            im2vec(self.mask).nonzero(as_tuple=True)[0],
+            persistent=False,
+        )
         self.learnable_ifft = LearnableFourier2D(
             n, inverse=True, learnable=learnable
         )
+        self.forward = _maybe_compile(self.forward, compiled)
 
     def forward(self, y):
         masked_fft = torch.zeros(
             *y.shape[:-1], self.n[0] * self.n[1], device=y.device
         )
-        masked_fft[..., im2vec(self.mask)] = y
+        masked_fft.index_copy_(-1, self.idx, y)
         return self.learnable_ifft(vec2im(masked_fft, self.n))
 
 
@@ -844,7 +1035,7 @@ class LearnableInverter(torch.nn.Module):
 class CGInverterLayer(torch.nn.Module):
     """ Solves a batch of positive definite linear systems using the PCG.
 
-    This class is a wrapper of `torch_cg.CG` making it compatible with our
+    This class is a wrapper of `_cg_batch` making it compatible with our
     input signal specifications for 2D image signals.
 
     The class provides a batched foward operation solving a linear system
@@ -875,27 +1066,33 @@ class CGInverterLayer(torch.nn.Module):
         Maximum number of CG iterations to perform. (Default 5*n1*n2)
     verbose : bool, optional
         Whether or not to print status messages. (Default False)
+    compiled : bool, optional
+        Wrap the batch-wise matrix multiplies with `torch.compile` (if
+        available). (Default False)
     """
 
-    def __init__(self, shape, A_bmm, M_bmm=None, **kwargs):
+    def __init__(self, shape, A_bmm, M_bmm=None, compiled=False, **kwargs):
         super().__init__()
 
+        shape = tuple(shape)
+        self.numel = numel = int(np.prod(shape))
+
         def _A_bmm(X):
             """ Shape compatible wrapper for A_bmm. """
-            AX = A_bmm(X.view((-1,) + shape))
-            AX_flat = torch.flatten(AX, -3, -1).unsqueeze(-1)
-            return AX_flat
+            return A_bmm(X.view((-1,) + shape)).reshape(-1, numel, 1)
 
         def _M_bmm(X):
             """ Shape compatible wrapper for M_bmm. """
-            MX = M_bmm(X.view((-1,) + shape))
-            MX_flat = torch.flatten(MX, -3, -1).unsqueeze(-1)
-            return MX_flat
+            return M_bmm(X.view((-1,) + shape)).reshape(-1, numel, 1)
 
-        self.A_bmm = _A_bmm
-        self.M_bmm = _M_bmm if M_bmm is not None else None
+        self.A_bmm = _maybe_compile(_A_bmm, compiled)
+        self.M_bmm = (
+            _maybe_compile(_M_bmm, compiled) if M_bmm is not None else None
+        )
 
-        self.func = _CGInverterFunc(self.A_bmm, self.M_bmm, **kwargs)
+        self.func = _CGInverterFunc(
+            self.numel, self.A_bmm, self.M_bmm, **kwargs
+        )
 
     def forward(self, B, X0=None):
         """ Solves the linear system given a right hand side.
@@ -915,11 +1112,119 @@ class CGInverterLayer(torch.nn.Module):
         return self.func(B, X0)
 
 
+def _cg_batch(
+    A_bmm,
+    B,
+    M_bmm=None,
+    X0=None,
+    rtol=1e-3,
+    atol=0.0,
+    maxiter=None,
+    verbose=False,
+):
+    """ Solves a batch of positive definite linear systems using the PCG.
+
+    Follows `torch_cg.cg_batch`, but allocates the iterates and the scratch
+    buffer once per solve and updates them in-place. Each iteration applies
+    A_bmm once and stops on the norm of the recursively updated residual.
+
+    Parameters
+    ----------
+    A_bmm : callable
+        Performs the batch-wise matrix multiply of A and a [K, n, m] tensor.
+    B : torch.Tensor
+        The right hand sides of shape [K, n, m].
+    M_bmm : callable, optional
+        Performs the batch-wise matrix multiply of the preconditioning
+        matrix M and a [K, n, m] tensor. Set to `None` to use no
+        preconditioning. (Default None)
+    X0 : torch.Tensor, optional
+        Initial guess for X. Set `None` to use M_bmm(B). (Default None)
+    rtol : float, optional
+        Relative tolerance for norm of residual. (Default 1e-3)
+    atol : float, optional
+        Absolute tolerance for norm of residual. (Default 0.0)
+    maxiter : int, optional
+        Maximum number of CG iterations to perform. (Default 5*n)
+    verbose : bool, optional
+        Whether or not to print status messages. (Default False)
+
+    Returns
+    -------
+    torch.Tensor
+        The solution X.
+    dict
+        The number of iterations `niter` and whether the tolerance was
+        reached `optimal`.
+    """
+    K, n, m = B.shape
+    if maxiter is None:
+        maxiter = 5 * n
+
+    if X0 is None:
+        X = (M_bmm(B) if M_bmm is not None else B).clone()
+    else:
+        X = X0.clone()
+    R = B - A_bmm(X)
+    Z = M_bmm(R) if M_bmm is not None else R  # aliases R without precond.
+    P = Z.clone()
+    tmp = torch.empty_like(R)
+    rz = torch.mul(R, Z, out=tmp).sum(1, keepdim=True)
+
+    B_norm = torch.norm(B, dim=1)
+    stopping_matrix = torch.clamp_min(rtol * B_norm, atol)
+
+    if verbose:
+        print("%03s | %010s" % ("it", "dist"))
+
+    optimal = False
+    for k in range(1, maxiter + 1):
+        AP = A_bmm(P)
+        pAp = torch.mul(P, AP, out=tmp).sum(1, keepdim=True)
+        alpha = rz / pAp.masked_fill_(pAp == 0, 1e-8)
+        X.addcmul_(alpha, P)
+        R.addcmul_(alpha, AP, value=-1)
+
+        residual_norm = torch.norm(R, dim=1)
+        if verbose:
+            print(
+                "%03d | %8.4e"
+                % (k, torch.max(residual_norm - stopping_matrix))
+            )
+        if (residual_norm <= stopping_matrix).all():
+            optimal = True
+            break
+
+        if M_bmm is not None:
+            Z = M_bmm(R)
+        rz_new = torch.mul(R, Z, out=tmp).sum(1, keepdim=True)
+        beta = rz_new / rz.masked_fill_(rz == 0, 1e-8)
+        P.mul_(beta).add_(Z)
+        rz = rz_new
+
+    if verbose:
+        print(
+            "Terminated in %d steps (%s)."
+            % (k, "reached tolerance" if optimal else "maximum iterations")
+        )
+
+    return X, {"niter": k, "optimal": optimal}
+
+
 def _CGInverterFunc(
-    A_bmm, M_bmm, rtol=1e-5, atol=0.0, maxiter=None, verbose=False
+    numel, A_bmm, M_bmm, rtol=1e-5, atol=0.0, maxiter=None, verbose=False
 ):
     """ Helper function for building CGInverter autograd functions. """
 
+    def _solve(B, X0):
+        """ Solves the flattened systems for right hand sides B. """
+        B_flat = B.reshape(-1, numel, 1)
+        X0_flat = X0.reshape(-1, numel, 1) if X0 is not None else X0
+        X, _ = _cg_batch(
+            A_bmm, B_flat, M_bmm, X0_flat, rtol, atol, maxiter, verbose
+        )
+        return X.view(B.shape)
+
     class _CGInverter(torch.autograd.Function):
         """ The actual CGInverter autograd function. """
 
@@ -927,28 +1232,28 @@ def _CGInverterFunc(
         def forward(ctx, *params):
             B, X0 = params  # unpack input parameters
             ctx.in_grads = [p is not None and p.requires_grad for p in params]
-            B_flat = torch.flatten(B, -3, -1).unsqueeze(-1)
-            X0_flat = (
-                torch.flatten(X0, -3, -1).unsqueeze(-1)
-                if X0 is not None
-                else X0
-            )
-            X, _ = torch_cg.cg_batch(
-                A_bmm, B_flat, M_bmm, X0_flat, rtol, atol, maxiter, verbose
-            )
-            return X.view(B.shape)
+            return _solve(B, X0)
 
         @staticmethod
         def backward(ctx, *params):
             (dX,) = params  # unpack input parameters
-            dX_flat = torch.flatten(dX, -3, -1).unsqueeze(-1)
-            dB, _ = torch_cg.cg_batch(
+            dX_flat = dX.reshape(-1, numel, 1)
+            dB, _ = _cg_batch(
                 A_bmm, dX_flat, M_bmm, None, rtol, atol, maxiter, verbose
             )
-            grads = [dB.view(dX.shape), 0.0 * dX]
-            for i in range(len(grads)):
-                if not ctx.in_grads[i]:
-                    grads[i] = None
-            return tuple(grads)
+            # the solution does not depend on the initial guess X0
+            return (
+                dB.view(dX.shape) if ctx.in_grads[0] else None,
+                torch.zeros_like(dX) if ctx.in_grads[1] else None,
+            )
+
+    def _apply(B, X0):
+        """ Skips the autograd function if no gradients are needed. """
+        if torch.is_grad_enabled() and any(
+            p is not None and p.requires_grad for p in (B, X0)
+        ):
+            return _CGInverter.apply(B, X0)
+        with torch.no_grad():  # as inside the autograd function
+            return _solve(B, X0)
 
-    return _CGInverter.apply
+    return _apply
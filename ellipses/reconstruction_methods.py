@@ -12,6 +12,13 @@ from operators import CGInverterLayer, l2_error, shrink
 # ----- Iterative reconstruction algorithms -----
 
 
+def _per_sample(param, ndim):
+    """ Broadcasts per-sample parameters against tensors with ndim dims. """
+    if torch.is_tensor(param):
+        return param.view((-1,) + (1,) * (ndim - 1))
+    return param
+
+
 def admm_l1_rec_diag(
     y, OpA, OpW, x0, z0, lam, rho, iter=20, silent=False,
 ):
@@ -38,10 +45,12 @@ def admm_l1_rec_diag(
     z0 : torchTensor
         Initial guess for the coefficients, typically torch.zeros(...) of
         appropriate size.
-    lam : float
+    lam : float or torch.Tensor
         The regularization parameter lambda for the sparsity constraint.
-    rho : float
+        A tensor of shape (batch,) sets one value per sample.
+    rho : float or torch.Tensor
         The Lagrangian augmentation parameter for the ADMM algorithm.
+        A tensor of shape (batch,) sets one value per sample.
     iter : int, optional
         Number of ADMM iterations. (Default 20)
     silent : bool, optional
@@ -57,29 +66,36 @@ def admm_l1_rec_diag(
     z = z0.clone()
     x = x0.clone()
     u = torch.zeros_like(z0)
-    tv_kernel = OpW.get_fourier_kernel()
+    tv_kernel = OpW.get_fourier_kernel().to(y.device)
+    rho_x = _per_sample(rho, x0.ndim)
+    rho_k = _per_sample(rho, x0.ndim - 1)  # complex kernel has no channel
+    thresh = _per_sample(lam / rho, z0.ndim)
 
     # run main ADMM iterations
     t = tqdm(range(iter), desc="ADMM iterations", disable=silent)
     for it in t:
         # ADMM step 1) : signal update
-        rhs = OpA.adj(y) + rho * OpW.adj(z - u)
-        x = OpA.tikh(rhs, tv_kernel, rho)
+        rhs = OpA.adj(y) + rho_x * OpW.adj(z - u)
+        x = OpA.tikh(rhs, tv_kernel, rho_k)
 
         # ADMM step 2) : coefficient update
-        zold, z = z, shrink(OpW(x) + u, lam / rho)
+        Wx = OpW(x)
+        Wx_u = Wx + u
+        zold, z = z, shrink(Wx_u, thresh)
 
         # ADMM step 3 : dual variable update
-        u = u + OpW(x) - z
+        u = Wx_u - z
 
-        # evaluate
+        # evaluate (only shown in the progress bar, skip the host syncs)
+        if silent:
+            continue
         with torch.no_grad():
             loss = (
                 0.5 * (OpA(x) - y).pow(2).sum(dim=(-1, -2))
-                + lam * OpW(x).abs().sum((-1, -2))
+                + lam * Wx.abs().sum((-1, -2))
             ).mean()
-            primal_residual = OpW(x) - z
-            dual_residual = rho * OpW.adj(zold - z)
+            primal_residual = Wx - z
+            dual_residual = rho_x * OpW.adj(zold - z)
 
             t.set_postfix(
                 loss=loss.item(),
@@ -91,7 +107,17 @@ def admm_l1_rec_diag(
 
 
 def admm_l1_rec(
-    y, OpA, OpW, x0, z0, lam, rho, iter=20, silent=False, timeout=None,
+    y,
+    OpA,
+    OpW,
+    x0,
+    z0,
+    lam,
+    rho,
+    iter=20,
+    silent=False,
+    timeout=None,
+    compiled=False,
 ):
     """ ADMM for least squares solve with L1 regularization.
 
@@ -114,16 +140,21 @@ def admm_l1_rec(
     z0 : torchTensor
         Initial guess for the coefficients, typically torch.zeros(...) of
         appropriate size.
-    lam : float
+    lam : float or torch.Tensor
         The regularization parameter lambda for the sparsity constraint.
-    rho : float
+        A tensor of shape (batch,) sets one value per sample.
+    rho : float or torch.Tensor
         The Lagrangian augmentation parameter for the ADMM algorithm.
+        A tensor of shape (batch,) sets one value per sample.
     iter : int, optional
         Number of ADMM iterations. (Default 20)
     silent : bool, optional
         Disable progress bar. (Default False)
     timeout : int, optional
         Set runtime limit in seconds. (Default None)
+    compiled : bool, optional
+        Wrap the operator applications of the conjugate gradient inversion
+        with `torch.compile` (if available). (Default False)
 
     Returns
     -------
@@ -135,14 +166,17 @@ def admm_l1_rec(
     z = z0.clone()
     x = x0.clone()
     u = torch.zeros_like(z0)
+    rho_x = _per_sample(rho, x0.ndim)
+    thresh = _per_sample(lam / rho, z0.ndim)
 
     # prepare conjugate gradient inversion
     inverter = CGInverterLayer(
         x.shape[1:],
-        lambda x: OpA.adj(OpA(x)) + rho * OpW.adj(OpW(x)),
+        lambda x: OpA.adj(OpA(x)) + rho_x * OpW.adj(OpW(x)),
         rtol=1e-6,
         atol=0.0,
         maxiter=200,
+        compiled=compiled,
     )
 
     if timeout is not None:
@@ -158,23 +192,27 @@ def admm_l1_rec(
                 return x, z
 
         # ADMM step 1) : signal update
-        rhs = OpA.adj(y) + rho * OpW.adj(z - u)
+        rhs = OpA.adj(y) + rho_x * OpW.adj(z - u)
         x = inverter(rhs, x)
 
         # ADMM step 2) : coefficient update
-        zold, z = z, shrink(OpW(x) + u, lam / rho)
+        Wx = OpW(x)
+        Wx_u = Wx + u
+        zold, z = z, shrink(Wx_u, thresh)
 
         # ADMM step 3 : dual variable update
-        u = u + OpW(x) - z
+        u = Wx_u - z
 
-        # evaluate
+        # evaluate (only shown in the progress bar, skip the host syncs)
+        if silent:
+            continue
         with torch.no_grad():
             loss = (
                 0.5 * (OpA(x) - y).pow(2).sum(dim=(-1, -2))
-                + lam * OpW(x).abs().sum((-1, -2))
+                + lam * Wx.abs().sum((-1, -2))
             ).mean()
-            primal_residual = OpW(x) - z
-            dual_residual = rho * OpW.adj(zold - z)
+            primal_residual = Wx - z
+            dual_residual = rho_x * OpW.adj(zold - z)
 
             t.set_postfix(
                 loss=loss.item(),
@@ -188,31 +226,52 @@ def admm_l1_rec(
 # ----- Utility -----
 
 
-def grid_search(x, y, rec_func, grid):
-    """ Grid search utility for tuning hyper-parameters. """
+def grid_search(x, y, rec_func, grid, batch_size=1):
+    """ Grid search utility for tuning hyper-parameters.
+
+    For `batch_size > 1` that many grid points are reconstructed at once,
+    stacking copies of `y` along the batch dimension. `rec_func` then
+    receives the parameters as tensors with one value per stacked sample.
+    """
     err_min = np.inf
     grid_param = None
 
     grid_shape = [len(val) for val in grid.values()]
     err = torch.zeros(grid_shape)
 
-    for grid_val, nidx in zip(
-        itertools.product(*grid.values()), np.ndindex(*grid_shape)
-    ):
-        grid_param_cur = dict(zip(grid.keys(), grid_val))
-        print(
-            "Current grid parameters ("
-            + str([cidx + 1 for cidx in nidx])
-            + " / "
-            + str(grid_shape)
-            + "): "
-            + str(grid_param_cur)
-        )
-        x_rec = rec_func(y, **grid_param_cur)
-        err[nidx], _ = l2_error(x_rec, x, relative=True, squared=False)
-        print("Rel. recovery error: {:1.2e}".format(err[nidx]), flush=True)
-        if err[nidx] < err_min:
-            grid_param = grid_param_cur
-            err_min = err[nidx]
+    grid_points = list(
+        zip(itertools.product(*grid.values()), np.ndindex(*grid_shape))
+    )
+    for start in range(0, len(grid_points), batch_size):
+        grid_batch = grid_points[start : start + batch_size]
+        for grid_val, nidx in grid_batch:
+            print(
+                "Current grid parameters ("
+                + str([cidx + 1 for cidx in nidx])
+                + " / "
+                + str(grid_shape)
+                + "): "
+                + str(dict(zip(grid.keys(), grid_val)))
+            )
+        if batch_size == 1:
+            grid_val, _ = grid_batch[0]
+            x_recs = [rec_func(y, **dict(zip(grid.keys(), grid_val)))]
+        else:
+            grid_vals = torch.tensor(
+                [grid_val for grid_val, _ in grid_batch],
+                dtype=y.dtype,
+                device=y.device,
+            ).repeat_interleave(y.shape[0], dim=0)
+            x_recs = rec_func(
+                y.repeat(len(grid_batch), *(1,) * (y.ndim - 1)),
+                **dict(zip(grid.keys(), grid_vals.unbind(-1))),
+            ).chunk(len(grid_batch))
+
+        for (grid_val, nidx), x_rec in zip(grid_batch, x_recs):
+            err[nidx], _ = l2_error(x_rec, x, relative=True, squared=False)
+            print("Rel. recovery error: {:1.2e}".format(err[nidx]), flush=True)
+            if err[nidx] < err_min:
+                grid_param = dict(zip(grid.keys(), grid_val))
+                err_min = err[nidx]
 
     return grid_param, err_min, err
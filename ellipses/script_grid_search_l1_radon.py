@@ -33,10 +33,14 @@ X_0 = X_0.to(device)
 noise_min = 5e-3
 noise_max = 3e-2
 noise_steps = 10
-noise_rel = torch.tensor(
-    np.logspace(np.log10(noise_min), np.log10(noise_max), num=noise_steps)
+noise_rel = torch.logspace(
+    np.log10(noise_min),
+    np.log10(noise_max),
+    steps=noise_steps,
+    dtype=torch.float64,
+    device=device,
 ).float()
-noise_rel = torch.cat([torch.zeros(1).float(), noise_rel]).float().to(device)
+noise_rel = torch.cat([noise_rel.new_zeros(1), noise_rel])
 
 
 def meas_noise(y, noise_level):
@@ -46,23 +50,24 @@ def meas_noise(y, noise_level):
 # ----- set up reconstruction method and grid params --------
 
 
-def _reconstruct(y, lam, rho):
+def _reconstruct(y, lam, rho, x0, z0):
     x, _ = admm_l1_rec(
         y,
         OpA,
         OpTV,
-        0.0 * OpA.adj(y),
-        0.0 * OpTV(OpA.adj(y)),
+        x0,
+        z0,
         lam,
         rho,
         iter=20,
         silent=False,
-        timeout=1800,
+        timeout=1800 * len(y) // len(X_0),  # 1800s for each grid point
     )
     return x
 
 
-# parameter search grid
+# parameter search grid, evaluating grid_batch_size points at once
+grid_batch_size = 10
 grid = {
     "lam": np.logspace(-2, 2, 10),
     "rho": np.logspace(-1, 3, 10),
@@ -70,16 +75,14 @@ grid = {
 
 
 def combine_results():
-    results = pd.DataFrame(
-        columns=["noise_rel", "grid_param", "err_min", "grid", "err"]
+    results = pd.concat(
+        [
+            pd.read_pickle(
+                os.path.join(save_path, file_name + str(idx) + ".pkl")
+            )
+            for idx in range(len(noise_rel))
+        ]
     )
-    for idx in range(len(noise_rel)):
-        results_cur = pd.read_pickle(
-            os.path.join(save_path, file_name + str(idx) + ".pkl")
-        )
-        results.loc[idx] = results_cur.loc[idx]
-
-    os.makedirs(save_path, exist_ok=True)
     results.to_pickle(os.path.join(save_path, file_name + "all.pkl"))
 
     return results
@@ -91,25 +94,42 @@ if __name__ == "__main__":
 
     idx_noise = (int(os.environ.get("SGE_TASK_ID")) - 1,)
 
-    for idx in idx_noise:
-        noise_level = noise_rel[idx] * OpA(X_0).norm(
-            p=2, dim=(-2, -1), keepdim=True
-        )
-        Y_ref = meas_noise(OpA(X_0), noise_level)
-        grid_param, err_min, err = grid_search(X_0, Y_ref, _reconstruct, grid)
-
-        results = pd.DataFrame(
-            columns=["noise_rel", "grid_param", "err_min", "grid", "err"]
-        )
-        results.loc[idx] = {
-            "noise_rel": noise_rel[idx],
-            "grid_param": grid_param,
-            "err_min": err_min,
-            "grid": grid,
-            "err": err,
-        }
-
-        os.makedirs(save_path, exist_ok=True)
-        results.to_pickle(
-            os.path.join(save_path, file_name + str(idx) + ".pkl")
-        )
+    os.makedirs(save_path, exist_ok=True)
+
+    # nothing here requires gradients, skip the autograd bookkeeping
+    with torch.inference_mode():
+        # noiseless measurements are shared by all noise levels
+        Y_0 = OpA(X_0)
+        Y_0_norm = Y_0.norm(p=2, dim=(-2, -1), keepdim=True)
+
+        for idx in idx_noise:
+            noise_level = noise_rel[idx] * Y_0_norm
+            Y_ref = meas_noise(Y_0, noise_level)
+
+            # initial guesses are shared by all grid parameters
+            x0 = X_0.new_zeros(grid_batch_size * len(X_0), *X_0.shape[1:])
+            z0 = x0.new_zeros(*x0.shape[:-2], OpTV.m)
+            grid_param, err_min, err = grid_search(
+                X_0,
+                Y_ref,
+                lambda y, lam, rho: _reconstruct(
+                    y, lam, rho, x0[: len(y)], z0[: len(y)]
+                ),
+                grid,
+                batch_size=grid_batch_size,
+            )
+
+            results = pd.DataFrame(
+                columns=["noise_rel", "grid_param", "err_min", "grid", "err"]
+            )
+            results.loc[idx] = {
+                "noise_rel": noise_rel[idx],
+                "grid_param": grid_param,
+                "err_min": err_min,
+                "grid": grid,
+                "err": err,
+            }
+
+            results.to_pickle(
+                os.path.join(save_path, file_name + str(idx) + ".pkl")
+            )